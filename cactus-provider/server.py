@@ -4,7 +4,8 @@ Run: python cactus-provider/server.py
 Env: CACTUS_MODEL_PATH, CACTUS_WHISPER_MODEL_PATH, CACTUS_PORT (default 8472)
 """
 
-import json, os, sys, time, uuid, atexit, re, tempfile
+import asyncio, functools, json, logging, os, secrets, sys, time, atexit, tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 _cactus_src_candidates = (
     os.environ.get("CACTUS_PYTHON_SRC"),
@@ -17,28 +18,42 @@ for _candidate in _cactus_src_candidates:
 
 from cactus import cactus_init, cactus_complete, cactus_destroy, cactus_reset, cactus_transcribe
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+import orjson
 from pydantic import BaseModel
 from typing import Any, Optional
 import uvicorn
 
+logging.basicConfig(
+    level=os.environ.get("CACTUS_LOG_LEVEL", "INFO").upper(),
+    format="[%(name)s] %(message)s",
+)
+log = logging.getLogger("cactus-provider")
+
 MODEL_PATH = os.path.abspath(os.environ.get(
     "CACTUS_MODEL_PATH",
     os.path.join(os.path.dirname(__file__),
                  "../../functiongemma-hackathon/cactus/weights/functiongemma-270m-it"),
 ))
 
-print(f"[cactus-provider] Loading model from {MODEL_PATH}…")
-_model = cactus_init(MODEL_PATH)
-print(f"[cactus-provider] Model ready.")
+# Model instances are checked out of an asyncio.Queue per request instead of
+# being pinned to threads, so any free instance can serve the next completion.
+_POOL_SIZE = max(1, int(os.environ.get("CACTUS_POOL_SIZE", "1")))
+
+log.info("Loading %d model instance(s) from %s…", _POOL_SIZE, MODEL_PATH)
+_models = [cactus_init(MODEL_PATH) for _ in range(_POOL_SIZE)]
+_model_pool: asyncio.Queue = asyncio.Queue()
+for _m in _models:
+    _model_pool.put_nowait(_m)
+log.info("Model ready.")
 
 WHISPER_MODEL_ID = "whisper-small"
 WHISPER_MODEL_PATH = os.environ.get("CACTUS_WHISPER_MODEL_PATH")
 if WHISPER_MODEL_PATH:
     WHISPER_MODEL_PATH = os.path.abspath(WHISPER_MODEL_PATH)
-    print(f"[cactus-provider] Whisper endpoint configured for {WHISPER_MODEL_PATH}")
+    log.info("Whisper endpoint configured for %s", WHISPER_MODEL_PATH)
 else:
-    print("[cactus-provider] Whisper endpoint disabled (set CACTUS_WHISPER_MODEL_PATH)")
+    log.info("Whisper endpoint disabled (set CACTUS_WHISPER_MODEL_PATH)")
 
 _whisper_model = None
 
@@ -52,23 +67,79 @@ def _get_whisper_model():
     if not os.path.exists(WHISPER_MODEL_PATH):
         raise HTTPException(status_code=503, detail=f"Whisper model path not found: {WHISPER_MODEL_PATH}")
 
-    print(f"[cactus-provider] Loading whisper model from {WHISPER_MODEL_PATH}…")
+    log.info("Loading whisper model from %s…", WHISPER_MODEL_PATH)
     _whisper_model = cactus_init(WHISPER_MODEL_PATH)
     if not _whisper_model:
         raise HTTPException(status_code=500, detail="Failed to initialize whisper model")
-    print("[cactus-provider] Whisper model ready.")
+    log.info("Whisper model ready.")
     return _whisper_model
 
 
 @atexit.register
 def _cleanup():
-    cactus_destroy(_model)
+    for _m in _models:
+        cactus_destroy(_m)
     if _whisper_model:
         cactus_destroy(_whisper_model)
 
-app = FastAPI()
-
-ALLOWED_TOOLS = {"read", "edit", "write", "exec", "process"}
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# One worker per loaded model instance: inference runs here instead of the
+# shared Starlette threadpool, so slow completions can't starve other routes.
+_exec = ThreadPoolExecutor(max_workers=_POOL_SIZE)
+
+ALLOWED_TOOLS = frozenset({"read", "edit", "write", "exec", "process"})
+
+_SSE_DONE = b"data: [DONE]\n\n"
+
+# One compact encoder instance for tool-call arguments; skips per-call
+# json.dumps option handling and drops the padding spaces.
+_dump_args = json.JSONEncoder(separators=(",", ":")).encode
+
+def _sse(payload):
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+def normalize_content(content):
+    if isinstance(content, list):
+        if len(content) == 1:
+            # Common case: a single text block, no join needed.
+            block = content[0]
+            if isinstance(block, dict) and block.get("type") == "text":
+                return block.get("text", "")
+            return ""
+        parts = []
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        return " ".join(parts)
+    return content or ""
+
+@functools.lru_cache(maxsize=64)
+def strip_tooling_section(text):
+    # OpenClaw re-sends the same multi-KB system prompt every turn, so the
+    # stripped result is cached on the raw string. str.find beats a DOTALL
+    # regex here: the marker is a fixed literal and everything after it goes.
+    idx = text.find("## Tooling")
+    if idx >= 0:
+        text = text[:idx]
+    return text.strip()
+
+def normalize_messages(raw_messages):
+    # Flatten content blocks, strip the tooling section from system prompts
+    # (already handled via the tools param), drop empty messages. Hot names
+    # are bound to locals so the loop stays free of global lookups.
+    out = []
+    append = out.append
+    _content = normalize_content
+    _strip = strip_tooling_section
+    for m in raw_messages:
+        role = m.get("role", "?")
+        content = _content(m.get("content", ""))
+        if role == "system":
+            content = _strip(content)
+        if content.strip():
+            append({"role": role, "content": content})
+    return out
 
 class ChatRequest(BaseModel):
     model: str
@@ -78,103 +149,159 @@ class ChatRequest(BaseModel):
     max_tokens: Optional[int] = 512
     stream: Optional[bool] = False
 
-@app.get("/health")
-def health():
-    return {"status": "ok", "model": MODEL_PATH, "whisper": bool(WHISPER_MODEL_PATH)}
+# /health and /v1/models can't change after startup, so both bodies are
+# encoded once and served straight from the ASGI wrapper below, bypassing
+# FastAPI routing and response validation entirely.
+_HEALTH_BODY = orjson.dumps({"status": "ok", "model": MODEL_PATH, "whisper": bool(WHISPER_MODEL_PATH)})
 
-@app.get("/v1/models")
-def models():
-    data = [{"id": "functiongemma-270m-it", "object": "model"}]
-    if WHISPER_MODEL_PATH:
-        data.append({"id": WHISPER_MODEL_ID, "object": "model"})
-    return {"object": "list", "data": data}
+_models_data = [{"id": "functiongemma-270m-it", "object": "model"}]
+if WHISPER_MODEL_PATH:
+    _models_data.append({"id": WHISPER_MODEL_ID, "object": "model"})
+_MODELS_BODY = orjson.dumps({"object": "list", "data": _models_data})
+
+async def _send_json(send, body, head=False):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+async def asgi(scope, receive, send):
+    if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+        path = scope["path"]
+        head = scope["method"] == "HEAD"
+        if path == "/health":
+            return await _send_json(send, _HEALTH_BODY, head)
+        if path == "/v1/models":
+            return await _send_json(send, _MODELS_BODY, head)
+    await app(scope, receive, send)
+
+# KV-cache reuse across turns is opt-in (CACTUS_KV_REUSE=1): when a request
+# strictly extends the conversation last fed to an instance, the reset is
+# skipped and only the new suffix messages are appended onto the live cache.
+# Whether cactus keeps KV state across calls isn't established in this tree,
+# so the default stays reset-and-full-prefill on every call.
+_KV_REUSE = os.environ.get("CACTUS_KV_REUSE", "0") == "1"
+_last_ctx: dict[int, tuple] = {}
+
+def _sync_infer(model, messages, cactus_tools, force_tools, max_tokens):
+    key = id(model)
+    ctx = tuple((m["role"], m["content"]) for m in messages)
+    prev = _last_ctx.get(key) if _KV_REUSE else None
+    if prev is not None and len(ctx) > len(prev) and ctx[:len(prev)] == prev:
+        messages = messages[len(prev):]
+    else:
+        cactus_reset(model)
+    # Dropped before the call so a failed completion can't leave the cache
+    # claiming a conversation it never finished; restored only on success.
+    _last_ctx.pop(key, None)
+    raw_str = cactus_complete(
+        model,
+        messages,
+        tools=cactus_tools if cactus_tools else None,
+        force_tools=force_tools,
+        max_tokens=max_tokens,
+        stop_sequences=["<|im_end|>", "<end_of_turn>"],
+    )
+    if _KV_REUSE:
+        _last_ctx[key] = ctx
+    return raw_str
 
-@app.post("/v1/chat/completions")
-def complete(req: ChatRequest):
-    print(f"[cactus-provider] >> request: {len(req.messages)} messages, {len(req.tools or [])} tools")
+@app.post("/v1/chat/completions", response_class=ORJSONResponse)
+async def complete(req: ChatRequest):
+    log.debug(">> request: %d messages, %d tools", len(req.messages), len(req.tools or []))
     t0 = time.time()
 
-    cactus_reset(_model)
-
-    ALLOWED_TOOLS = {"read", "edit", "write", "exec", "process"}
     cactus_tools = [
         t for t in (req.tools or [])
         if t.get("function", {}).get("name") in ALLOWED_TOOLS
     ]
     has_tools = bool(cactus_tools)
     force_tools = has_tools and req.tool_choice != "none"
-    print(f"  [filtered tools] {[t['function']['name'] for t in cactus_tools]}")
-
-    # Normalize messages:
-    # 1. Extract plain text from content blocks ([{'type':'text','text':'...'}])
-    # 2. Strip the ## Tooling section from system prompt (already handled via tools param)
-    def normalize_content(content):
-        if isinstance(content, list):
-            return " ".join(
-                block.get("text", "") for block in content
-                if isinstance(block, dict) and block.get("type") == "text"
-            )
-        return content or ""
-
-    def strip_tooling_section(text):
-        import re
-        return re.sub(r"## Tooling.*", "", text, flags=re.DOTALL).strip()
-
-    messages = []
-    for m in req.messages:
-        role = m.get("role", "?")
-        content = normalize_content(m.get("content", ""))
-        if role == "system":
-            content = strip_tooling_section(content)
-        if content.strip():
-            messages.append({"role": role, "content": content})
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("  [filtered tools] %s", [t["function"]["name"] for t in cactus_tools])
 
-    print(f"  [messages going to model]")
-    for m in messages:
-        print(f"    [{m['role']}] {m['content'][:200]}")
+    messages = normalize_messages(req.messages)
 
-    raw_str = cactus_complete(
-        _model,
-        messages,
-        tools=cactus_tools if has_tools else None,
-        force_tools=force_tools,
-        max_tokens=req.max_tokens or 512,
-        stop_sequences=["<|im_end|>", "<end_of_turn>"],
-    )
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("  [messages going to model]")
+        for m in messages:
+            log.debug("    [%s] %s", m["role"], m["content"][:200])
 
+    model = await _model_pool.get()
     try:
-        raw = json.loads(raw_str)
+        raw_str = await asyncio.get_running_loop().run_in_executor(
+            _exec, _sync_infer, model, messages, cactus_tools, force_tools, req.max_tokens or 512,
+        )
+    finally:
+        _model_pool.put_nowait(model)
+
+    try:
+        raw = orjson.loads(raw_str)
+        if not isinstance(raw, dict):
+            raw = {"response": str(raw_str), "function_calls": []}
     except Exception:
         raw = {"response": str(raw_str), "function_calls": []}
 
-    calls = raw.get("function_calls", [])
-    print(f"[cactus-provider] << done in {(time.time()-t0)*1000:.0f}ms — {'tool_calls: ' + str([c['name'] for c in calls]) if calls else 'text: ' + repr(raw.get('response','')[:80])}")
-
-    if calls:
-        message = {
-            "role": "assistant",
-            "content": None,
-            "tool_calls": [{
-                "id": f"call_{uuid.uuid4().hex[:8]}",
-                "type": "function",
-                "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))},
-            } for c in calls],
-        }
+    # Single pass over the raw calls; the debug log reads names back out of
+    # the built list rather than re-indexing the raw dicts.
+    tool_calls = [{
+        "id": f"call_{secrets.token_hex(4)}",
+        "type": "function",
+        "function": {"name": c["name"], "arguments": _dump_args(c.get("arguments", {}))},
+    } for c in raw.get("function_calls", [])]
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("<< done in %.0fms — %s", (time.time() - t0) * 1000,
+                  "tool_calls: " + str([tc["function"]["name"] for tc in tool_calls]) if tool_calls
+                  else "text: " + repr(raw.get("response", "")[:80]))
+
+    if tool_calls:
+        message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
         finish_reason = "tool_calls"
     else:
         message = {"role": "assistant", "content": raw.get("response", "")}
         finish_reason = "stop"
 
+    if req.stream:
+        def sse():
+            # One chunk dict is built once and mutated between yields; only
+            # the delta/finish_reason fields change per event.
+            chunk = {
+                "id": f"chatcmpl-{secrets.token_hex(6)}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": req.model,
+                "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}],
+            }
+            yield _sse(chunk)
+            choice = chunk["choices"][0]
+            if tool_calls:
+                choice["delta"] = {"tool_calls": [dict(tc, index=i) for i, tc in enumerate(tool_calls)]}
+            else:
+                choice["delta"] = {"content": message["content"]}
+            yield _sse(chunk)
+            choice["delta"] = {}
+            choice["finish_reason"] = finish_reason
+            yield _sse(chunk)
+            yield _SSE_DONE
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    rget = raw.get
     return {
-        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "id": f"chatcmpl-{secrets.token_hex(6)}",
         "object": "chat.completion",
         "created": int(time.time()),
         "model": req.model,
         "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
         "usage": {
-            "prompt_tokens": raw.get("prefill_tokens", 0),
-            "completion_tokens": raw.get("decode_tokens", 0),
-            "total_tokens": raw.get("total_tokens", 0),
+            "prompt_tokens": rget("prefill_tokens", 0),
+            "completion_tokens": rget("decode_tokens", 0),
+            "total_tokens": rget("total_tokens", 0),
         },
     }
 
@@ -228,5 +355,5 @@ async def transcribe_audio(
 
 if __name__ == "__main__":
     port = int(os.environ.get("CACTUS_PORT", 8472))
-    print(f"[cactus-provider] Listening on http://127.0.0.1:{port}/v1")
-    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+    log.info("Listening on http://127.0.0.1:%d/v1", port)
+    uvicorn.run(asgi, host="127.0.0.1", port=port, loop="uvloop", http="httptools", log_level="warning")